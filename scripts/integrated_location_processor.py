@@ -7,9 +7,22 @@ from mysql.connector import Error
 import os
 import math
 import time
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Any, Tuple
 import googlemaps
+from poi_snapshot import PoiSnapshot, SnapshotTableBuilder, write_snapshot
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 
 class IntegratedLocationProcessor:
     def __init__(self):
@@ -21,6 +34,10 @@ class IntegratedLocationProcessor:
             'port': int(os.getenv('DB_PORT', 3306))
         }
         self.connection = None
+        self.idle_connections = queue.LifoQueue()
+        self.dedicated_connections_failed = False
+        self.shared_connection_lock = threading.Lock()
+        self.snapshot = None
         self.gmaps_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
         if self.gmaps_key:
             self.gmaps = googlemaps.Client(key=self.gmaps_key)
@@ -38,6 +55,37 @@ class IntegratedLocationProcessor:
         self.airport_radius_km = 40.0
         self.golf_radius_km = 15.0
 
+        # Concurrent fetches per project (each DB task borrows or lazily opens its own connection)
+        try:
+            max_workers = int(os.getenv('PROCESSOR_MAX_WORKERS', 12))
+        except ValueError:
+            max_workers = 12
+        self.max_workers = max(1, min(max_workers, 32))
+
+        # Cached highlights are reused for this many months
+        self.cache_ttl_months = 2
+
+        # Google Maps requests issued by this processor, used to enforce refresh budgets
+        self.api_calls = 0
+        self.api_calls_lock = threading.Lock()
+
+        # Requests per second shared by every worker thread
+        try:
+            api_qps = float(os.getenv('GOOGLE_MAPS_QPS', 50))
+        except ValueError:
+            api_qps = 50.0
+        self.api_qps = api_qps if api_qps > 0 else 50.0
+        self.next_api_slot = 0.0
+
+        # Rows fetched per round trip when streaming exports and snapshots
+        self.export_chunk_size = 5000
+        # Fetch chunks are combined into Parquet row groups of this many rows
+        self.parquet_row_group_size = 131072
+        self.export_columns = [
+            'project_id', 'poi_type', 'name', 'address', 'distance_km', 'step1_score', 'rating',
+            'rating_count', 'driving_distance', 'lat', 'lng', 'priority', 'category', 'created_at'
+        ]
+
     def connect_to_database(self):
         """Establish connection to MySQL database"""
         try:
@@ -51,8 +99,62 @@ class IntegratedLocationProcessor:
 
     def close_connection(self):
         """Close database connection"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        if self.connection:
+            # No is_connected() ping: it fails while an unbuffered result is unread, leaving the socket open
+            try:
+                self.connection.close()
+            except Error:
+                pass
+
+    @contextmanager
+    def pooled_connection(self):
+        """Borrow an idle worker connection, opening one in the calling thread if none is free"""
+        if self.snapshot:
+            # Candidates come from the mapped snapshot, so no connection is needed
+            yield None
+            return
+
+        connection = None
+        if not self.dedicated_connections_failed:
+            while connection is None:
+                try:
+                    candidate = self.idle_connections.get_nowait()
+                except queue.Empty:
+                    break
+                if candidate.is_connected():
+                    connection = candidate
+
+            if connection is None:
+                # Opened lazily inside the worker, so handshakes overlap instead of running up front
+                try:
+                    connection = mysql.connector.connect(**self.db_config)
+                except Error as e:
+                    if not self.dedicated_connections_failed:
+                        print(f"Error opening worker connection, falling back to the shared connection: {e}", file=sys.stderr)
+                    self.dedicated_connections_failed = True
+
+        if connection is None:
+            # Only one thread at a time may use the shared connection
+            with self.shared_connection_lock:
+                yield self.connection
+            return
+
+        try:
+            yield connection
+        finally:
+            self.idle_connections.put(connection)
+
+    def close_idle_connections(self):
+        """Close worker connections kept for reuse across projects"""
+        while True:
+            try:
+                connection = self.idle_connections.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                connection.close()
+            except Error:
+                pass
 
     def safe_float(self, value) -> float:
         """Safely convert value to native Python float"""
@@ -72,6 +174,16 @@ class IntegratedLocationProcessor:
         except (ValueError, TypeError):
             return 0
 
+    def acquire_api_slot(self):
+        """Count one Google Maps request and wait for its turn under the shared rate limit"""
+        with self.api_calls_lock:
+            self.api_calls += 1
+            now = time.monotonic()
+            slot = max(now, self.next_api_slot)
+            self.next_api_slot = slot + 1.0 / self.api_qps
+        if slot > now:
+            time.sleep(slot - now)
+
     def haversine_distance(self, lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Calculate the great circle distance between two points on Earth in kilometers"""
         R = 6371  # Radius of Earth in kilometers
@@ -93,41 +205,55 @@ class IntegratedLocationProcessor:
             # Fallback to circular distance if no API key
             return [f"{self.haversine_distance(origin[0], origin[1], dest[0], dest[1]):.1f}" for dest in destinations]
         
+        batches = [destinations[i:i + batch_size] for i in range(0, len(destinations), batch_size)]
+        if len(batches) > 1:
+            # Independent batches are requested concurrently and joined in order
+            with ThreadPoolExecutor(max_workers=min(len(batches), self.max_workers)) as executor:
+                batch_results = list(executor.map(lambda batch: self.get_distance_matrix_batch(origin, batch), batches))
+        else:
+            batch_results = [self.get_distance_matrix_batch(origin, batch) for batch in batches]
+
         distances = []
-        for i in range(0, len(destinations), batch_size):
-            batch = destinations[i:i + batch_size]
-            try:
-                result = self.gmaps.distance_matrix(
-                    origins=[origin],
-                    destinations=batch,
-                    mode='driving',
-                    units='metric'
-                )
-                for j, element in enumerate(result['rows'][0]['elements']):
-                    if element['status'] == 'OK':
-                        # Extract numeric value from distance text (e.g., "7.2 km" -> "7.2")
-                        distance_text = element['distance']['text']
-                        distance_value = distance_text.replace(' km', '').replace(',', '')
-                        distances.append(distance_value)
-                    else:
-                        # Fallback to circular distance
-                        if j < len(batch):
-                            dest = batch[j]
-                            circular_dist = self.haversine_distance(origin[0], origin[1], dest[0], dest[1])
-                            distances.append(f"{circular_dist:.1f}")
-                        else:
-                            distances.append('0')
-            except Exception as e:
-                print(f"Error in batch {i}-{i+batch_size}: {e}", file=sys.stderr)
-                # Fallback to circular distances for this batch
-                for dest in batch:
-                    circular_dist = self.haversine_distance(origin[0], origin[1], dest[0], dest[1])
-                    distances.append(f"{circular_dist:.1f}")
-            
-            time.sleep(0.1)  # Avoid rate-limiting
+        for batch_distances in batch_results:
+            distances.extend(batch_distances)
         
         return distances
 
+    def get_distance_matrix_batch(self, origin: Tuple[float, float], batch: List[Tuple[float, float]]) -> List[str]:
+        """Get driving distances for a single batch of destinations"""
+        distances = []
+        try:
+            self.acquire_api_slot()
+            result = self.gmaps.distance_matrix(
+                origins=[origin],
+                destinations=batch,
+                mode='driving',
+                units='metric'
+            )
+            for j, element in enumerate(result['rows'][0]['elements']):
+                if element['status'] == 'OK':
+                    # Extract numeric value from distance text (e.g., "7.2 km" -> "7.2")
+                    distance_text = element['distance']['text']
+                    distance_value = distance_text.replace(' km', '').replace(',', '')
+                    distances.append(distance_value)
+                else:
+                    # Fallback to circular distance
+                    if j < len(batch):
+                        dest = batch[j]
+                        circular_dist = self.haversine_distance(origin[0], origin[1], dest[0], dest[1])
+                        distances.append(f"{circular_dist:.1f}")
+                    else:
+                        distances.append('0')
+        except Exception as e:
+            print(f"Error in distance matrix batch of {len(batch)}: {e}", file=sys.stderr)
+            # Fallback to circular distances for this batch
+            distances = []
+            for dest in batch:
+                circular_dist = self.haversine_distance(origin[0], origin[1], dest[0], dest[1])
+                distances.append(f"{circular_dist:.1f}")
+
+        return distances
+
     def get_project_data(self, project_id: str) -> Dict[str, Any]:
         """Get project information from projects table using actual schema"""
         if not self.connection:
@@ -149,24 +275,24 @@ class IntegratedLocationProcessor:
             return {}
 
     def check_existing_highlights(self, project_id: str) -> Tuple[bool, List[Dict[str, Any]]]:
-        """Check if highlights exist and are less than 2 months old"""
+        """Check if highlights exist and are younger than the cache TTL (2 months)"""
         if not self.connection:
             return False, []
 
         try:
             cursor = self.connection.cursor(dictionary=True)
             
-            # Check for existing highlights within 2 months
+            # Check for existing highlights within the cache TTL
             query = """
             SELECT *, 
                    DATEDIFF(NOW(), created_at) as days_old
             FROM location_highlights
             WHERE project_id = %s 
-            AND created_at >= DATE_SUB(NOW(), INTERVAL 2 MONTH)
+            AND created_at >= DATE_SUB(NOW(), INTERVAL %s MONTH)
             ORDER BY step1_score DESC
             """
             
-            cursor.execute(query, (project_id,))
+            cursor.execute(query, (project_id, self.cache_ttl_months))
             results = cursor.fetchall()
             cursor.close()
             
@@ -202,16 +328,20 @@ class IntegratedLocationProcessor:
             print(f"Error checking existing highlights: {e}", file=sys.stderr)
             return False, []
 
-    def get_surrounding_pois_by_category(self, project_lat: float, project_lng: float, poi_category: str, radius_km: float = None) -> List[Dict[str, Any]]:
+    def get_surrounding_pois_by_category(self, project_lat: float, project_lng: float, poi_category: str, radius_km: float = None, connection=None) -> List[Dict[str, Any]]:
         """Get POIs of specific category within radius using actual schema"""
-        if not self.connection:
-            return []
-
         if radius_km is None:
             radius_km = self.poi_radius_km
 
+        if self.snapshot:
+            return self.get_snapshot_pois_by_category(project_lat, project_lng, poi_category, radius_km)
+
+        connection = connection or self.connection
+        if not connection:
+            return []
+
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            cursor = connection.cursor(dictionary=True)
             
             # Using bounding box for initial filtering
             lat_range = radius_km / 111.0
@@ -247,16 +377,20 @@ class IntegratedLocationProcessor:
             print(f"Error fetching POI data for {poi_category}: {e}", file=sys.stderr)
             return []
 
-    def get_nearby_airports(self, project_lat: float, project_lng: float, radius_km: float = None) -> List[Dict[str, Any]]:
+    def get_nearby_airports(self, project_lat: float, project_lng: float, radius_km: float = None, connection=None) -> List[Dict[str, Any]]:
         """Get airports within specified radius using actual schema"""
-        if not self.connection:
-            return []
-
         if radius_km is None:
             radius_km = self.airport_radius_km
 
+        if self.snapshot:
+            return self.get_snapshot_airports(project_lat, project_lng, radius_km)
+
+        connection = connection or self.connection
+        if not connection:
+            return []
+
         try:
-            cursor = self.connection.cursor(dictionary=True)
+            cursor = connection.cursor(dictionary=True)
             
             lat_range = radius_km / 111.0
             lng_range = radius_km / (111.0 * math.cos(math.radians(project_lat)))
@@ -289,6 +423,220 @@ class IntegratedLocationProcessor:
             print(f"Error fetching airport data: {e}", file=sys.stderr)
             return []
 
+    def load_snapshot(self, snapshot_path: str, max_age_days: int = None) -> bool:
+        """Memory-map a POI snapshot so candidate lookups skip the database, refusing stale snapshots"""
+        # Results are cached for the TTL, so by default a snapshot may be at most that old
+        if max_age_days is None:
+            max_age_days = self.cache_ttl_months * 30
+
+        try:
+            snapshot = PoiSnapshot(snapshot_path)
+        except (OSError, ValueError) as e:
+            print(f"Error loading POI snapshot: {e}", file=sys.stderr)
+            return False
+
+        try:
+            age_days = (datetime.now() - datetime.fromisoformat(snapshot.built_at)).total_seconds() / 86400
+        except (TypeError, ValueError) as e:
+            snapshot.close()
+            print(f"Error loading POI snapshot: invalid build time: {e}", file=sys.stderr)
+            return False
+        if age_days > max_age_days:
+            snapshot.close()
+            print(f"Error loading POI snapshot: built {age_days:.1f} days ago, older than {max_age_days} days", file=sys.stderr)
+            return False
+
+        self.snapshot = snapshot
+        print(f"Using POI snapshot {snapshot_path} built at {snapshot.built_at}", file=sys.stderr)
+        return True
+
+    def get_snapshot_pois_by_category(self, project_lat: float, project_lng: float, poi_category: str, radius_km: float) -> List[Dict[str, Any]]:
+        """Get POIs of specific category within radius from the mapped snapshot"""
+        pois = self.snapshot.table('pois')
+        type_range = pois.header['type_ranges'].get(poi_category)
+        if not type_range:
+            return []
+
+        lat_range = radius_km / 111.0
+        lng_range = radius_km / (111.0 * math.cos(math.radians(project_lat)))
+        lats = pois.columns['lat']
+        lngs = pois.columns['lng']
+
+        # Rows are sorted by type then latitude, so the bounding box is a bisected slice
+        candidates = []
+        for row in pois.lat_band('lat', project_lat - lat_range, project_lat + lat_range, type_range[0], type_range[1]):
+            if abs(lngs[row] - project_lng) > lng_range:
+                continue
+            distance = self.haversine_distance(project_lat, project_lng, lats[row], lngs[row])
+            if distance <= radius_km:
+                candidates.append((distance, row))
+
+        candidates.sort()
+        results = []
+        for distance, row in candidates[:50]:
+            rating = pois.columns['rating'][row]
+            rating_count = pois.columns['rating_count'][row]
+            results.append({
+                'poi_type': poi_category,
+                'primary_type': pois.category('primary_type', row),
+                'name': pois.string('name', row),
+                'address': pois.string('address', row),
+                'rating': None if math.isnan(rating) else rating,
+                'rating_count': None if rating_count < 0 else rating_count,
+                'lat': lats[row],
+                'lng': lngs[row],
+                'circular_distance_km': distance
+            })
+        return results
+
+    def get_snapshot_airports(self, project_lat: float, project_lng: float, radius_km: float) -> List[Dict[str, Any]]:
+        """Get airports within specified radius from the mapped snapshot"""
+        airports = self.snapshot.table('airports')
+
+        lat_range = radius_km / 111.0
+        lng_range = radius_km / (111.0 * math.cos(math.radians(project_lat)))
+        lats = airports.columns['latitude_deg']
+        lngs = airports.columns['longitude_deg']
+
+        candidates = []
+        for row in airports.lat_band('latitude_deg', project_lat - lat_range, project_lat + lat_range):
+            if abs(lngs[row] - project_lng) > lng_range:
+                continue
+            distance = self.haversine_distance(project_lat, project_lng, lats[row], lngs[row])
+            if distance <= radius_km:
+                candidates.append((distance, row))
+
+        candidates.sort()
+        results = []
+        for distance, row in candidates[:10]:
+            score = airports.columns['score'][row]
+            results.append({
+                'name': airports.string('name', row),
+                'address': airports.string('address', row),
+                'type': airports.category('type', row),
+                'score': None if math.isnan(score) else score,
+                'latitude_deg': lats[row],
+                'longitude_deg': lngs[row],
+                'circular_distance_km': distance
+            })
+        return results
+
+    def build_poi_snapshot(self, output_path: str, chunk_size: int = None) -> Dict[str, Any]:
+        """Stream poi_extractions_surrounding and airports into a memory-mappable snapshot file"""
+        if chunk_size is None:
+            chunk_size = self.export_chunk_size
+
+        if not self.connect_to_database():
+            return {"error": "Database connection failed"}
+
+        pois = SnapshotTableBuilder(
+            {'lat': 'd', 'lng': 'd', 'rating': 'd', 'rating_count': 'q'},
+            ['name', 'address'],
+            ['primary_type']
+        )
+        airports = SnapshotTableBuilder(
+            {'latitude_deg': 'd', 'longitude_deg': 'd', 'score': 'd'},
+            ['name', 'address'],
+            ['type']
+        )
+        type_ranges = {}
+        cursor = None
+
+        try:
+            # Binary ordering keeps each exact poi_type contiguous whatever the column collation
+            cursor = self.connection.cursor(dictionary=True, buffered=False)
+            cursor.execute("""
+            SELECT poi_type, primary_type, name, address, rating, rating_count, lat, lng
+            FROM poi_extractions_surrounding
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+            ORDER BY CAST(poi_type AS BINARY), lat
+            """)
+            previous_type = None
+            previous_lat = -math.inf
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    # Lookups bisect each type's rows by latitude, so verify the order rather than trust it
+                    poi_type = row['poi_type'] or ''
+                    if poi_type != previous_type:
+                        if poi_type in type_ranges:
+                            raise ValueError(f"poi_type {poi_type!r} rows are not contiguous")
+                        type_ranges[poi_type] = [pois.rows, pois.rows]
+                        previous_type = poi_type
+                        previous_lat = -math.inf
+                    lat = self.safe_float(row['lat'])
+                    if lat < previous_lat:
+                        raise ValueError(f"poi_type {poi_type!r} rows are not sorted by latitude")
+                    previous_lat = lat
+
+                    pois.append({
+                        'lat': lat,
+                        'lng': self.safe_float(row['lng']),
+                        'rating': self.safe_float(row['rating']) if row['rating'] is not None else math.nan,
+                        'rating_count': self.safe_int(row['rating_count']) if row['rating_count'] is not None else -1,
+                        'name': row['name'],
+                        'address': row['address'],
+                        'primary_type': row['primary_type']
+                    })
+                    type_ranges[poi_type][1] = pois.rows
+            cursor.close()
+            cursor = None
+
+            cursor = self.connection.cursor(dictionary=True, buffered=False)
+            cursor.execute("""
+            SELECT type, name, address, score, latitude_deg, longitude_deg
+            FROM airports
+            WHERE latitude_deg IS NOT NULL AND longitude_deg IS NOT NULL
+            ORDER BY latitude_deg
+            """)
+            previous_lat = -math.inf
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    lat = self.safe_float(row['latitude_deg'])
+                    if lat < previous_lat:
+                        raise ValueError("airport rows are not sorted by latitude")
+                    previous_lat = lat
+
+                    airports.append({
+                        'latitude_deg': lat,
+                        'longitude_deg': self.safe_float(row['longitude_deg']),
+                        'score': self.safe_float(row['score']) if row['score'] is not None else math.nan,
+                        'name': row['name'],
+                        'address': row['address'],
+                        'type': row['type']
+                    })
+            cursor.close()
+            cursor = None
+
+            result = write_snapshot(
+                output_path,
+                {'pois': pois, 'airports': airports},
+                extra={'pois': {'type_ranges': type_ranges}}
+            )
+            result.update({
+                "poi_count": pois.rows,
+                "airport_count": airports.rows,
+                "poi_types": len(type_ranges),
+                "processed_at": datetime.now().isoformat()
+            })
+            return result
+
+        except (Error, OSError, ValueError, OverflowError, TypeError) as e:
+            return {"error": f"Error building POI snapshot: {str(e)}"}
+
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+            self.close_connection()
+
     def get_nearby_golf_courses(self, project_lat: float, project_lng: float, radius_km: float = None) -> List[Dict[str, Any]]:
         """Get nearby golf courses using Google Places API"""
         if not self.gmaps:
@@ -300,6 +648,7 @@ class IntegratedLocationProcessor:
         radius_meters = int(radius_km * 1000)
         
         try:
+            self.acquire_api_slot()
             search_result = self.gmaps.places(
                 query="golf course",
                 location=(project_lat, project_lng),
@@ -417,6 +766,118 @@ class IntegratedLocationProcessor:
         scored_golf.sort(key=lambda x: x['distance_km'])
         return scored_golf
 
+    def get_category_highlights(self, project_data: Dict[str, Any], project_coords: Tuple[float, float], poi_category: str) -> List[Dict[str, Any]]:
+        """Fetch, score and pick the top POI of one category"""
+        project_lat, project_lng = project_coords
+        try:
+            with self.pooled_connection() as connection:
+                pois = self.get_surrounding_pois_by_category(project_lat, project_lng, poi_category, connection=connection)
+        except Error as e:
+            print(f"Error fetching POI data for {poi_category}: {e}", file=sys.stderr)
+            return []
+        if not pois:
+            return []
+
+        scored_pois = self.compute_poi_scores(pois, project_coords, poi_category)
+        if not scored_pois:
+            return []
+
+        # Take top POI from each category
+        top_poi = scored_pois[0]
+        
+        highlight = {
+            'project_id': project_data['project_id'],
+            'poi_type': poi_category,
+            'name': top_poi.get('name', f'Top {poi_category.replace("_", " ").title()}'),
+            'address': top_poi.get('address', ''),
+            'distance_km': self.safe_float(top_poi.get('distance_km', 0)),
+            'step1_score': round(self.safe_float(top_poi.get('step1_score', 0)), 6),
+            'rating': self.safe_float(top_poi.get('rating')) if top_poi.get('rating') else None,
+            'rating_count': self.safe_int(top_poi.get('rating_count')) if top_poi.get('rating_count') else None,
+            'driving_distance': str(top_poi.get('driving_distance', '')),
+            'lat': self.safe_float(top_poi.get('lat')),
+            'lng': self.safe_float(top_poi.get('lng')),
+            'priority': 'high' if poi_category in ['hospital', 'metro_station'] else 'medium',
+            'category': 'poi',
+            'from_cache': False
+        }
+        
+        return [highlight]
+
+    def get_golf_highlights(self, project_data: Dict[str, Any], project_coords: Tuple[float, float]) -> List[Dict[str, Any]]:
+        """Fetch, score and pick the top golf courses"""
+        golf_courses = self.get_nearby_golf_courses(project_coords[0], project_coords[1])
+        if not golf_courses:
+            return []
+
+        scored_golf = self.compute_golf_scores(golf_courses, project_coords)
+        
+        # Take top 2 golf courses
+        highlights = []
+        for golf in scored_golf[:2]:
+            highlight = {
+                'project_id': project_data['project_id'],
+                'poi_type': 'golf_course',
+                'name': golf.get('name', 'Golf Course'),
+                'address': golf.get('address', ''),
+                'distance_km': self.safe_float(golf.get('distance_km', 0)),
+                'step1_score': round(self.safe_float(golf.get('golf_score', 0)), 6),
+                'rating': self.safe_float(golf.get('rating')) if golf.get('rating') else None,
+                'rating_count': self.safe_int(golf.get('rating_count')) if golf.get('rating_count') else None,
+                'driving_distance': str(golf.get('driving_distance', '')),
+                'lat': self.safe_float(golf.get('lat')),
+                'lng': self.safe_float(golf.get('lng')),
+                'priority': 'medium',
+                'category': 'recreation',
+                'from_cache': False
+            }
+            
+            highlights.append(highlight)
+        
+        return highlights
+
+    def get_airport_highlights(self, project_data: Dict[str, Any], project_coords: Tuple[float, float]) -> List[Dict[str, Any]]:
+        """Fetch nearby airports and pick the closest two"""
+        try:
+            with self.pooled_connection() as connection:
+                airports = self.get_nearby_airports(project_coords[0], project_coords[1], connection=connection)
+        except Error as e:
+            print(f"Error fetching airport data: {e}", file=sys.stderr)
+            return []
+        if not airports:
+            return []
+
+        # Get driving distances for airports
+        airport_destinations = [(self.safe_float(airport['latitude_deg']), self.safe_float(airport['longitude_deg'])) for airport in airports]
+        airport_distances = self.get_distance_matrix_in_batches(project_coords, airport_destinations)
+        
+        # Take top 2 airports
+        highlights = []
+        for i, airport in enumerate(airports[:2]):
+            distance_str = airport_distances[i] if i < len(airport_distances) else "0"
+            distance_km = self.safe_float(distance_str)
+            
+            highlight = {
+                'project_id': project_data['project_id'],
+                'poi_type': 'airport',
+                'name': airport.get('name', 'Airport'),
+                'address': airport.get('address', ''),
+                'distance_km': distance_km,
+                'step1_score': self.safe_float(airport.get('score', 50.0)),
+                'rating': None,
+                'rating_count': None,
+                'driving_distance': str(distance_str),
+                'lat': self.safe_float(airport.get('latitude_deg')),
+                'lng': self.safe_float(airport.get('longitude_deg')),
+                'priority': 'high' if airport.get('type') == 'large_airport' else 'medium',
+                'category': 'transportation',
+                'from_cache': False
+            }
+            
+            highlights.append(highlight)
+        
+        return highlights
+
     def save_highlights_to_db(self, highlights: List[Dict[str, Any]]) -> bool:
         """Save generated highlights to database using actual schema with proper type conversion"""
         if not self.connection or not highlights:
@@ -465,8 +926,8 @@ class IntegratedLocationProcessor:
             print(f"Error saving highlights to database: {e}", file=sys.stderr)
             return False
 
-    def process_single_project(self, project_id: str) -> Dict[str, Any]:
-        """Process a single project with caching logic"""
+    def process_single_project(self, project_id: str, force_refresh: bool = False) -> Dict[str, Any]:
+        """Process a single project with caching logic, or recompute regardless of cache if force_refresh"""
         if not self.connect_to_database():
             return {"error": "Database connection failed"}
 
@@ -477,7 +938,10 @@ class IntegratedLocationProcessor:
                 return {"error": f"Project {project_id} not found"}
 
             # Check if recent highlights exist (≤ 2 months)
-            has_recent_highlights, cached_highlights = self.check_existing_highlights(project_id)
+            if force_refresh:
+                has_recent_highlights, cached_highlights = False, []
+            else:
+                has_recent_highlights, cached_highlights = self.check_existing_highlights(project_id)
         
             if has_recent_highlights:
                 print(f"Using cached highlights for project {project_id} (age: {cached_highlights[0]['days_old']} days)", file=sys.stderr)
@@ -509,98 +973,24 @@ class IntegratedLocationProcessor:
             project_coords = (project_lat, project_lng)
             
             all_highlights = []
-            
-            # Process each POI category
-            for poi_category in self.poi_categories:
-                pois = self.get_surrounding_pois_by_category(project_lat, project_lng, poi_category)
-                if pois:
-                    scored_pois = self.compute_poi_scores(pois, project_coords, poi_category)
-                    
-                    # Take top POI from each category
-                    if scored_pois:
-                        top_poi = scored_pois[0]
-                        
-                        highlight = {
-                            'project_id': project_data['project_id'],
-                            'poi_type': poi_category,
-                            'name': top_poi.get('name', f'Top {poi_category.replace("_", " ").title()}'),
-                            'address': top_poi.get('address', ''),
-                            'distance_km': self.safe_float(top_poi.get('distance_km', 0)),
-                            'step1_score': round(self.safe_float(top_poi.get('step1_score', 0)), 6),
-                            'rating': self.safe_float(top_poi.get('rating')) if top_poi.get('rating') else None,
-                            'rating_count': self.safe_int(top_poi.get('rating_count')) if top_poi.get('rating_count') else None,
-                            'driving_distance': str(top_poi.get('driving_distance', '')),
-                            'lat': self.safe_float(top_poi.get('lat')),
-                            'lng': self.safe_float(top_poi.get('lng')),
-                            'priority': 'high' if poi_category in ['hospital', 'metro_station'] else 'medium',
-                            'category': 'poi',
-                            'from_cache': False
-                        }
-                        
-                        all_highlights.append(highlight)
-            
-            # Process golf courses
-            golf_courses = self.get_nearby_golf_courses(project_lat, project_lng)
-            if golf_courses:
-                scored_golf = self.compute_golf_scores(golf_courses, project_coords)
-                
-                # Take top 2 golf courses
-                for golf in scored_golf[:2]:
-                    highlight = {
-                        'project_id': project_data['project_id'],
-                        'poi_type': 'golf_course',
-                        'name': golf.get('name', 'Golf Course'),
-                        'address': golf.get('address', ''),
-                        'distance_km': self.safe_float(golf.get('distance_km', 0)),
-                        'step1_score': round(self.safe_float(golf.get('golf_score', 0)), 6),
-                        'rating': self.safe_float(golf.get('rating')) if golf.get('rating') else None,
-                        'rating_count': self.safe_int(golf.get('rating_count')) if golf.get('rating_count') else None,
-                        'driving_distance': str(golf.get('driving_distance', '')),
-                        'lat': self.safe_float(golf.get('lat')),
-                        'lng': self.safe_float(golf.get('lng')),
-                        'priority': 'medium',
-                        'category': 'recreation',
-                        'from_cache': False
-                    }
-                    
-                    all_highlights.append(highlight)
-            
-            # Process airports
-            airports = self.get_nearby_airports(project_lat, project_lng)
-            if airports:
-                # Get driving distances for airports
-                airport_destinations = [(self.safe_float(airport['latitude_deg']), self.safe_float(airport['longitude_deg'])) for airport in airports]
-                airport_distances = self.get_distance_matrix_in_batches(project_coords, airport_destinations)
-                
-                # Take top 2 airports
-                for i, airport in enumerate(airports[:2]):
-                    distance_str = airport_distances[i] if i < len(airport_distances) else "0"
-                    distance_km = self.safe_float(distance_str)
-                    
-                    highlight = {
-                        'project_id': project_data['project_id'],
-                        'poi_type': 'airport',
-                        'name': airport.get('name', 'Airport'),
-                        'address': airport.get('address', ''),
-                        'distance_km': distance_km,
-                        'step1_score': self.safe_float(airport.get('score', 50.0)),
-                        'rating': None,
-                        'rating_count': None,
-                        'driving_distance': str(distance_str),
-                        'lat': self.safe_float(airport.get('latitude_deg')),
-                        'lng': self.safe_float(airport.get('longitude_deg')),
-                        'priority': 'high' if airport.get('type') == 'large_airport' else 'medium',
-                        'category': 'transportation',
-                        'from_cache': False
-                    }
-                    
-                    all_highlights.append(highlight)
+
+            # Fan out the independent category, golf and airport fetches and join them before ranking
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [
+                    executor.submit(self.get_category_highlights, project_data, project_coords, poi_category)
+                    for poi_category in self.poi_categories
+                ]
+                futures.append(executor.submit(self.get_golf_highlights, project_data, project_coords))
+                futures.append(executor.submit(self.get_airport_highlights, project_data, project_coords))
+
+                for future in futures:
+                    all_highlights.extend(future.result())
             
             # Sort all highlights by step1_score
             all_highlights.sort(key=lambda x: x['step1_score'], reverse=True)
             
             # Save to database
-            self.save_highlights_to_db(all_highlights)
+            saved = self.save_highlights_to_db(all_highlights)
 
             result = {
                 "project_id": project_id,
@@ -615,6 +1005,7 @@ class IntegratedLocationProcessor:
                 "golf_count": len([h for h in all_highlights if h['poi_type'] == 'golf_course']),
                 "airport_count": len([h for h in all_highlights if h['poi_type'] == 'airport']),
                 "from_cache": False,
+                "saved": saved,
                 "processed_at": datetime.now().isoformat()
             }
 
@@ -626,27 +1017,152 @@ class IntegratedLocationProcessor:
         finally:
             self.close_connection()
 
+    def get_expiring_projects(self, expiry_window_days: int) -> List[Dict[str, Any]]:
+        """Get projects whose cached highlights expire within the window, soonest first"""
+        if not self.connection:
+            return []
+
+        try:
+            cursor = self.connection.cursor(dictionary=True)
+            
+            # Still fresh now, but older than the TTL once the window has passed
+            query = """
+            SELECT project_id, MAX(created_at) AS refreshed_at
+            FROM location_highlights
+            GROUP BY project_id
+            HAVING refreshed_at >= DATE_SUB(NOW(), INTERVAL %s MONTH)
+            AND refreshed_at < DATE_SUB(DATE_ADD(NOW(), INTERVAL %s DAY), INTERVAL %s MONTH)
+            ORDER BY refreshed_at ASC
+            """
+            
+            cursor.execute(query, (self.cache_ttl_months, expiry_window_days, self.cache_ttl_months))
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+            
+        except Error as e:
+            print(f"Error fetching expiring projects: {e}", file=sys.stderr)
+            return []
+
+    def is_off_peak(self, off_peak_start: int, off_peak_end: int, now: datetime = None) -> bool:
+        """Check whether the current hour falls in the off-peak window (may wrap past midnight; equal bounds mean always)"""
+        if off_peak_start == off_peak_end:
+            return True
+        hour = (now or datetime.now()).hour
+        if off_peak_start <= off_peak_end:
+            return off_peak_start <= hour < off_peak_end
+        return hour >= off_peak_start or hour < off_peak_end
+
+    def refresh_expiring_highlights(self, expiry_window_days: int = 7, api_budget: int = 500,
+                                    off_peak_start: int = 1, off_peak_end: int = 6) -> Dict[str, Any]:
+        """Recompute highlights that are about to expire, within an off-peak window and API budget"""
+        if not (0 <= off_peak_start <= 23 and 0 <= off_peak_end <= 23):
+            return {"error": "Off-peak hours must be between 0 and 23"}
+        if api_budget < 0:
+            return {"error": "API budget must not be negative"}
+        if expiry_window_days < 0:
+            return {"error": "Expiry window must not be negative"}
+
+        if not self.is_off_peak(off_peak_start, off_peak_end):
+            return {
+                "skipped": True,
+                "reason": f"Outside off-peak window {off_peak_start:02d}:00-{off_peak_end:02d}:00",
+                "processed_at": datetime.now().isoformat()
+            }
+
+        if not self.connect_to_database():
+            return {"error": "Database connection failed"}
+
+        try:
+            expiring_projects = self.get_expiring_projects(expiry_window_days)
+        finally:
+            self.close_connection()
+
+        refreshed_projects = []
+        failed_projects = []
+        deferred_count = 0
+
+        # Worst case per project: two distance-matrix batches per category, plus golf search,
+        # golf distances and airport distances. Never estimate below it so the budget stays a hard cap.
+        worst_case_calls = len(self.poi_categories) * 2 + 3 if self.gmaps else 0
+        budget_start = self.api_calls
+
+        for index, project in enumerate(expiring_projects):
+            used_calls = self.api_calls - budget_start
+            if used_calls + worst_case_calls > api_budget:
+                deferred_count = len(expiring_projects) - index
+                break
+            if not self.is_off_peak(off_peak_start, off_peak_end):
+                deferred_count = len(expiring_projects) - index
+                break
+
+            project_id = project['project_id']
+            calls_before = self.api_calls
+            try:
+                result = self.process_single_project(project_id, force_refresh=True)
+            except Exception as e:
+                result = {"error": str(e)}
+            project_calls = self.api_calls - calls_before
+
+            # Old rows keep their created_at unless the new highlights were actually written
+            if "error" not in result and not result.get('saved'):
+                if result.get('total_highlights'):
+                    result = {"error": "Highlights could not be saved; existing rows left in place"}
+                else:
+                    result = {"error": "No highlights generated; existing rows left in place"}
+
+            if "error" not in result:
+                refreshed_projects.append({
+                    'project_id': project_id,
+                    'previous_refresh': project['refreshed_at'],
+                    'highlights_count': result['total_highlights'],
+                    'api_calls': project_calls
+                })
+            else:
+                failed_projects.append({
+                    'project_id': project_id,
+                    'error': result['error'],
+                    'api_calls': project_calls
+                })
+
+        return {
+            "expiringCount": len(expiring_projects),
+            "refreshedCount": len(refreshed_projects),
+            "failedCount": len(failed_projects),
+            "deferredCount": deferred_count,
+            "api_calls_used": self.api_calls - budget_start,
+            "api_budget": api_budget,
+            "refreshed_projects": refreshed_projects,
+            "failed_projects": failed_projects,
+            "processed_at": datetime.now().isoformat()
+        }
+
+    def read_project_ids(self, csv_file_path: str) -> List[str]:
+        """Read project IDs from the first column of a CSV, skipping an optional header"""
+        project_ids = []
+        
+        with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            first_row = next(reader, None)
+            if first_row and not first_row[0].startswith('PROJ') and not first_row[0].isdigit():
+                pass  # Skip header
+            else:
+                if first_row:
+                    project_ids.append(first_row[0].strip())
+        
+            for row in reader:
+                if row and row[0].strip():
+                    project_ids.append(row[0].strip())
+
+        return project_ids
+
     def process_multiple_projects(self, csv_file_path: str) -> Dict[str, Any]:
         """Process multiple project IDs with caching logic"""
         if not self.connect_to_database():
             return {"error": "Database connection failed"}
 
         try:
-            project_ids = []
-        
-            # Read project IDs from CSV
-            with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                first_row = next(reader, None)
-                if first_row and not first_row[0].startswith('PROJ') and not first_row[0].isdigit():
-                    pass  # Skip header
-                else:
-                    if first_row:
-                        project_ids.append(first_row[0].strip())
-            
-                for row in reader:
-                    if row and row[0].strip():
-                        project_ids.append(row[0].strip())
+            project_ids = self.read_project_ids(csv_file_path)
 
             all_highlights = []
             processed_projects = []
@@ -711,22 +1227,229 @@ class IntegratedLocationProcessor:
         finally:
             self.close_connection()
 
+    def export_row(self, row: Tuple) -> List[Any]:
+        """Convert a raw location_highlights row to native Python types for export"""
+        values = dict(zip(self.export_columns, row))
+        return [
+            str(values['project_id']),
+            values['poi_type'],
+            values['name'],
+            values['address'] or '',
+            self.safe_float(values['distance_km']),
+            self.safe_float(values['step1_score']),
+            self.safe_float(values['rating']) if values['rating'] is not None else None,
+            self.safe_int(values['rating_count']) if values['rating_count'] is not None else None,
+            values['driving_distance'] or '',
+            self.safe_float(values['lat']) if values['lat'] is not None else None,
+            self.safe_float(values['lng']) if values['lng'] is not None else None,
+            values['priority'],
+            values['category'],
+            values['created_at']
+        ]
+
+    def export_highlights(self, output_path: str, project_ids: List[str] = None, since: str = None, until: str = None,
+                          export_format: str = None, chunk_size: int = None) -> Dict[str, Any]:
+        """Stream location_highlights to a CSV or Parquet file in fixed-size chunks"""
+        if export_format is None:
+            export_format = 'parquet' if output_path.lower().endswith('.parquet') else 'csv'
+        if export_format not in ('csv', 'parquet'):
+            return {"error": f"Unsupported export format: {export_format}"}
+        if export_format == 'parquet' and pa is None:
+            return {"error": "Parquet export requires the pyarrow package"}
+        if chunk_size is None:
+            chunk_size = self.export_chunk_size
+
+        if project_ids is not None and not project_ids:
+            # An empty project list must never widen into a full-table export
+            return {"error": "No project IDs to export"}
+
+        conditions = []
+        params = []
+        if project_ids is not None:
+            conditions.append(f"project_id IN ({', '.join(['%s'] * len(project_ids))})")
+            params.extend(project_ids)
+        try:
+            if since:
+                conditions.append("created_at >= %s")
+                params.append(datetime.strptime(since, '%Y-%m-%d'))
+            if until:
+                # Inclusive of the whole end day
+                conditions.append("created_at < DATE_ADD(%s, INTERVAL 1 DAY)")
+                params.append(datetime.strptime(until, '%Y-%m-%d'))
+        except ValueError as e:
+            return {"error": f"Invalid date, expected YYYY-MM-DD: {e}"}
+
+        query = f"SELECT {', '.join(self.export_columns)} FROM location_highlights"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY project_id, step1_score DESC"
+
+        if not self.connect_to_database():
+            return {"error": "Database connection failed"}
+
+        exported_rows = 0
+        chunks = 0
+        cursor = None
+        writer = None
+        output_file = None
+        tmp_path = None
+        completed = False
+
+        try:
+            # Written beside the target and renamed on success, so a failed export never looks complete
+            output_dir = os.path.dirname(os.path.abspath(output_path))
+            fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f'.{os.path.basename(output_path)}.', suffix='.tmp')
+            os.close(fd)
+
+            # Unbuffered cursor: rows are read off the wire as they are fetched, so memory stays at one chunk
+            cursor = self.connection.cursor(buffered=False)
+            cursor.execute(query, tuple(params))
+
+            if export_format == 'csv':
+                output_file = open(tmp_path, 'w', newline='', encoding='utf-8')
+                writer = csv.writer(output_file)
+                writer.writerow(self.export_columns)
+            else:
+                schema = pa.schema([
+                    ('project_id', pa.string()),
+                    ('poi_type', pa.string()),
+                    ('name', pa.string()),
+                    ('address', pa.string()),
+                    ('distance_km', pa.float64()),
+                    ('step1_score', pa.float64()),
+                    ('rating', pa.float64()),
+                    ('rating_count', pa.int64()),
+                    ('driving_distance', pa.string()),
+                    ('lat', pa.float64()),
+                    ('lng', pa.float64()),
+                    ('priority', pa.string()),
+                    ('category', pa.string()),
+                    ('created_at', pa.timestamp('s'))
+                ])
+                writer = pq.ParquetWriter(tmp_path, schema)
+                pending_tables = []
+                pending_rows = 0
+
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+
+                export_rows = [self.export_row(row) for row in rows]
+                if export_format == 'csv':
+                    writer.writerows(export_rows)
+                else:
+                    columns = list(zip(*export_rows))
+                    pending_tables.append(pa.Table.from_arrays(
+                        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                        schema=schema
+                    ))
+                    pending_rows += len(rows)
+
+                    # Emit full row groups; the remainder waits for the next chunks
+                    if pending_rows >= self.parquet_row_group_size:
+                        pending = pa.concat_tables(pending_tables)
+                        while pending.num_rows >= self.parquet_row_group_size:
+                            writer.write_table(pending.slice(0, self.parquet_row_group_size))
+                            pending = pending.slice(self.parquet_row_group_size)
+                        pending_tables = [pending]
+                        pending_rows = pending.num_rows
+
+                exported_rows += len(rows)
+                chunks += 1
+
+            if export_format == 'parquet' and pending_rows:
+                writer.write_table(pa.concat_tables(pending_tables))
+
+            cursor.close()
+            cursor = None
+
+            if export_format == 'csv':
+                output_file.close()
+            else:
+                writer.close()
+            os.replace(tmp_path, output_path)
+            completed = True
+
+            return {
+                "output_path": output_path,
+                "format": export_format,
+                "exported_rows": exported_rows,
+                "chunks": chunks,
+                "processed_at": datetime.now().isoformat()
+            }
+
+        except (Error, OSError, ValueError, TypeError) as e:
+            return {"error": f"Error exporting highlights: {str(e)}"}
+
+        finally:
+            if not completed:
+                if output_file is not None:
+                    output_file.close()
+                if export_format == 'parquet' and writer is not None:
+                    writer.close()
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+            self.close_connection()
+
 def main():
     parser = argparse.ArgumentParser(description='Integrated location highlights processor with advanced scoring')
     parser.add_argument('--single', type=str, help='Single project ID to process')
     parser.add_argument('--multiple', type=str, help='CSV file path with multiple project IDs')
+    parser.add_argument('--export', type=str, help='Stream stored highlights to this CSV or Parquet file')
+    parser.add_argument('--projects', type=str, help='CSV file path with project IDs to export (default: all projects)')
+    parser.add_argument('--since', type=str, help='Export highlights created on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=str, help='Export highlights created on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--format', type=str, choices=['csv', 'parquet'], help='Export format (default: from file extension)')
+    parser.add_argument('--chunk-size', type=int, help='Rows fetched per chunk when exporting or building a snapshot')
+    parser.add_argument('--build-snapshot', type=str, help='Write a memory-mapped POI/airport snapshot to this path')
+    parser.add_argument('--snapshot', type=str, help='Read POI and airport candidates from this snapshot instead of the database')
+    parser.add_argument('--snapshot-max-age-days', type=int, help='Refuse snapshots older than this (default: the cache TTL)')
+    parser.add_argument('--refresh-expiring', action='store_true', help='Recompute cached highlights that are about to expire')
+    parser.add_argument('--expiry-window-days', type=int, default=7, help='Refresh highlights expiring within this many days')
+    parser.add_argument('--api-budget', type=int, default=500, help='Maximum Google Maps requests per refresh run')
+    parser.add_argument('--off-peak-start', type=int, default=1, help='Hour (0-23) the off-peak refresh window opens')
+    parser.add_argument('--off-peak-end', type=int, default=6, help='Hour (0-23) the off-peak refresh window closes (same as start: no window)')
     
     args = parser.parse_args()
     
     processor = IntegratedLocationProcessor()
     
     try:
-        if args.single:
+        if args.snapshot_max_age_days is not None and args.snapshot_max_age_days < 0:
+            result = {"error": "Snapshot max age must not be negative"}
+        elif args.snapshot and not processor.load_snapshot(args.snapshot, args.snapshot_max_age_days):
+            result = {"error": f"Could not load POI snapshot {args.snapshot} (missing, invalid or too old)"}
+        elif args.build_snapshot:
+            result = processor.build_poi_snapshot(args.build_snapshot, chunk_size=args.chunk_size)
+        elif args.single:
             result = processor.process_single_project(args.single)
         elif args.multiple:
             result = processor.process_multiple_projects(args.multiple)
+        elif args.export:
+            project_ids = processor.read_project_ids(args.projects) if args.projects else None
+            result = processor.export_highlights(
+                args.export,
+                project_ids=project_ids,
+                since=args.since,
+                until=args.until,
+                export_format=args.format,
+                chunk_size=args.chunk_size
+            )
+        elif args.refresh_expiring:
+            result = processor.refresh_expiring_highlights(
+                expiry_window_days=args.expiry_window_days,
+                api_budget=args.api_budget,
+                off_peak_start=args.off_peak_start,
+                off_peak_end=args.off_peak_end
+            )
         else:
-            result = {"error": "Please provide either --single or --multiple argument"}
+            result = {"error": "Please provide either --single, --multiple, --export, --refresh-expiring or --build-snapshot argument"}
         
         # Ensure clean JSON output
         print(json.dumps(result, default=str, ensure_ascii=False))
@@ -735,5 +1458,8 @@ def main():
         error_result = {"error": f"Script execution error: {str(e)}"}
         print(json.dumps(error_result, default=str))
 
+    finally:
+        processor.close_idle_connections()
+
 if __name__ == "__main__":
     main()
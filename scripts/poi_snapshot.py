@@ -0,0 +1,207 @@
+import sys
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+# File layout: MAGIC | version (uint32) | header length (uint32) | JSON header | column data.
+# Every column is a contiguous native-endian array aligned to 8 bytes, so readers can map it
+# with memoryview.cast() without copying. Strings are stored as int64 offsets into a UTF-8 blob,
+# low-cardinality strings as uint16 codes into a vocabulary kept in the header.
+MAX_CATEGORIES = 0xFFFF + 1
+MAGIC = b'LHSNAP\x00\x00'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 8
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class SnapshotTableBuilder:
+    """Accumulates rows for one snapshot table in compact typed arrays"""
+
+    def __init__(self, numeric_columns: Dict[str, str], string_columns: List[str], category_columns: List[str]):
+        self.numeric = {name: array(typecode) for name, typecode in numeric_columns.items()}
+        self.strings = {name: (array('q', [0]), bytearray()) for name in string_columns}
+        self.categories = {name: (array('H'), {}) for name in category_columns}
+        self.rows = 0
+
+    def append(self, values: Dict[str, Any]):
+        """Append one row; values must contain every column of the table"""
+        for name, column in self.numeric.items():
+            column.append(values[name])
+        for name, (offsets, blob) in self.strings.items():
+            blob.extend((values[name] or '').encode('utf-8'))
+            offsets.append(len(blob))
+        for name, (codes, vocab) in self.categories.items():
+            value = values[name] or ''
+            if value not in vocab:
+                if len(vocab) >= MAX_CATEGORIES:
+                    raise ValueError(f'More than {MAX_CATEGORIES} distinct values in column {name}')
+                vocab[value] = len(vocab)
+            codes.append(vocab[value])
+        self.rows += 1
+
+    def columns(self) -> Dict[str, Tuple[str, bytes]]:
+        """Serialised columns as name -> (typecode, raw bytes)"""
+        columns = {name: (column.typecode, column.tobytes()) for name, column in self.numeric.items()}
+        for name, (offsets, blob) in self.strings.items():
+            columns[f'{name}.offsets'] = ('q', offsets.tobytes())
+            columns[f'{name}.data'] = ('B', bytes(blob))
+        for name, (codes, vocab) in self.categories.items():
+            columns[f'{name}.codes'] = ('H', codes.tobytes())
+        return columns
+
+    def vocabularies(self) -> Dict[str, List[str]]:
+        return {name: list(vocab) for name, (codes, vocab) in self.categories.items()}
+
+
+def write_snapshot(path: str, tables: Dict[str, SnapshotTableBuilder], extra: Dict[str, Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Write tables to a snapshot file, replacing any existing file atomically"""
+    built_at = datetime.now().isoformat()
+    header = {
+        'format_version': FORMAT_VERSION,
+        'built_at': built_at,
+        'byteorder': sys.byteorder,
+        'tables': {}
+    }
+
+    payload = []
+    offset = 0
+    for table_name, builder in tables.items():
+        table_header = {'rows': builder.rows, 'columns': {}, 'vocab': builder.vocabularies()}
+        table_header.update((extra or {}).get(table_name, {}))
+        for column_name, (typecode, data) in builder.columns().items():
+            offset = _align(offset)
+            table_header['columns'][column_name] = {'typecode': typecode, 'offset': offset, 'length': len(data)}
+            payload.append((offset, data))
+            offset += len(data)
+        header['tables'][table_name] = table_header
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    # Readers that already mapped the old file keep their copy until they reopen;
+    # a unique temp name keeps concurrent builds from writing into each other's file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for column_offset, data in payload:
+                f.seek(data_start + column_offset)
+                f.write(data)
+            f.truncate(data_start + offset)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; worker processes may run as other users
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {'path': path, 'format_version': FORMAT_VERSION, 'built_at': built_at}
+
+
+class SnapshotTable:
+    """Zero-copy view over one table of a mapped snapshot"""
+
+    def __init__(self, name: str, table_header: Dict[str, Any], buffer: memoryview):
+        self.name = name
+        self.rows = table_header['rows']
+        self.vocab = table_header['vocab']
+        self.header = table_header
+        self.columns = {}
+        try:
+            for column_name, spec in table_header['columns'].items():
+                start = spec['offset']
+                if start + spec['length'] > len(buffer):
+                    raise ValueError(f'POI snapshot column {name}.{column_name} is truncated')
+                self.columns[column_name] = buffer[start:start + spec['length']].cast(spec['typecode'])
+        except Exception:
+            # Release views mapped so far so the snapshot can still be closed
+            self.release()
+            raise
+
+    def string(self, column: str, row: int) -> str:
+        offsets = self.columns[f'{column}.offsets']
+        data = self.columns[f'{column}.data']
+        return bytes(data[offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+    def category(self, column: str, row: int) -> str:
+        return self.vocab[column][self.columns[f'{column}.codes'][row]]
+
+    def lat_band(self, lat_column: str, min_lat: float, max_lat: float, start: int = 0, end: int = None) -> range:
+        """Rows in [start, end) whose latitude lies in the band; rows must be sorted by latitude there"""
+        lats = self.columns[lat_column]
+        if end is None:
+            end = self.rows
+        return range(bisect_left(lats, min_lat, start, end), bisect_right(lats, max_lat, start, end))
+
+    def release(self):
+        for column in self.columns.values():
+            column.release()
+        self.columns = {}
+
+
+class PoiSnapshot:
+    """Read-only memory-mapped snapshot; the OS page cache is shared by every process mapping it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tables = {}
+        self.file = open(path, 'rb')
+        try:
+            self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            self.file.close()
+            raise ValueError(f'Cannot map POI snapshot {path}: {e}')
+        self.buffer = memoryview(self.mmap)
+
+        try:
+            self._read_header()
+        except (struct.error, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Any malformed or truncated header is reported as an invalid snapshot
+            self.close()
+            raise ValueError(f'Invalid POI snapshot {path}: {e}')
+
+    def _read_header(self):
+        if len(self.buffer) < PREAMBLE.size:
+            raise ValueError('file is shorter than the snapshot preamble')
+
+        magic, version, header_length = PREAMBLE.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('not a POI snapshot')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'unsupported version {version} (expected {FORMAT_VERSION})')
+        if PREAMBLE.size + header_length > len(self.buffer):
+            raise ValueError('header is truncated')
+
+        header = json.loads(bytes(self.buffer[PREAMBLE.size:PREAMBLE.size + header_length]).decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f'built on a {header["byteorder"]}-endian machine')
+
+        self.built_at = header['built_at']
+        data = self.buffer[_align(PREAMBLE.size + header_length):]
+        try:
+            for name, table_header in header['tables'].items():
+                self.tables[name] = SnapshotTable(name, table_header, data)
+        finally:
+            data.release()
+
+    def table(self, name: str) -> SnapshotTable:
+        return self.tables[name]
+
+    def close(self):
+        for table in self.tables.values():
+            table.release()
+        self.tables = {}
+        self.buffer.release()
+        self.mmap.close()
+        self.file.close()